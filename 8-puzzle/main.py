@@ -1,26 +1,49 @@
-from copy import deepcopy
+from heapq import heapify, heappop, heappush
+from itertools import count
+from sys import maxsize
 from typing_extensions import Self
 
 # Dimension of the board, here 3x3.
 DIMENSION = 3
 
-# Representation of the empty tile.
-EMPTY = "0"
+# Representation of the empty tile, as a byte of the state.
+EMPTY = ord("0")
 
 # Debug mode flag.
 DEBUG = True
 
+# Search algorithm flag, IDA* if True, or A* otherwise.
+IDA_STAR = False
+
 # Initial state for debug purpose.
-DEBUG_START_STATE = [["2", "1", "3"], [EMPTY, "8", "4"], ["6", "7", "5"]]
+DEBUG_START_STATE = b"213084675"
 
 # Target state for debug purpose.
-DEBUG_TARGET_STATE = [["1", "2", "3"], ["8", EMPTY, "4"], ["7", "6", "5"]]
+DEBUG_TARGET_STATE = b"123804765"
+
+# Index of a tile in the flattened board, where 0 is the left-upper corner.
+Point = int
+
+# State of the board, represented by its tiles flattened row by row.
+State = bytes
+
+# Coordinates of each index, where (0, 0) is the left-upper corner of the board.
+COORDINATES = [divmod(index, DIMENSION) for index in range(DIMENSION * DIMENSION)]
 
-# Coordinate of a tile, where (0, 0) is the left-upper corner of the board.
-Point = tuple[int, int]
+# Directions that the empty tile can move towards, as (row, column) offsets.
+# Opposite directions differ only in the lowest bit, so `move ^ 1` reverses `move`.
+MOVES = [(-1, 0), (1, 0), (0, -1), (0, 1)]
 
-# State of the board, represented by a 2-dimensional matrix.
-State = list[list[str]]
+# Moves and the resulting indices that the empty tile can take from each index.
+NEXT_EMPTIES = [
+    [
+        (move, (row + row_offset) * DIMENSION + column + column_offset)
+        for move, (row_offset, column_offset) in enumerate(MOVES)
+        if 0 <= row + row_offset <= DIMENSION - 1
+        and 0 <= column + column_offset <= DIMENSION - 1
+    ]
+    for row, column in COORDINATES
+]
 
 
 class Node:
@@ -28,18 +51,35 @@ class Node:
     A* tree node.
     """
 
-    def __init__(self, state: State, target: State, parent: Self | None = None) -> None:
+    # Fixed attributes without a per-node dictionary, to keep nodes small.
+    __slots__ = ("__state", "__parent", "__last_move", "__empty", "__g", "__h", "__f")
+
+    # Target state, shared by all nodes of a search.
+    TARGET: State = b""
+
+    # Target coordinates of each tile, shared by all nodes of a search.
+    TARGET_POS: dict[int, tuple[int, int]] = {}
+
+    # Manhattan distance from each index to the target of each tile,
+    # shared by all nodes of a search.
+    DISTANCES: dict[int, list[int]] = {}
+
+    def __init__(
+        self, state: State, parent: Self | None = None, last_move: int = -1
+    ) -> None:
         """
         Initialize a node.
 
         Args:
             state: The current state.
-            target: The target state.
             parent: The parent node of this node, default to None.
+            last_move: The move of the empty tile from the parent,
+                default to -1 for no move.
         """
         self.__state = state
-        self.__target = target
         self.__parent = parent
+        self.__last_move = last_move
+        self.__empty = self.__find_empty()
 
         self.__g = self.__get_g()
         self.__h = self.__get_h()
@@ -53,7 +93,7 @@ class Node:
             The user-friendly string representation of the current state.
 
         Example:
-            State [["1", "2", "3"], ["4", "5", "6"], ["7", "8", "0"]]
+            State b"123456780"
             is displayed as
             1 2 3
             4 5 6
@@ -62,8 +102,13 @@ class Node:
         """
         return "\n".join(
             [
-                " ".join([" " if tile == EMPTY else tile for tile in line])
-                for line in self.__state
+                " ".join(
+                    [
+                        " " if tile == EMPTY else chr(tile)
+                        for tile in self.__state[start : start + DIMENSION]
+                    ]
+                )
+                for start in range(0, DIMENSION * DIMENSION, DIMENSION)
             ]
         )
 
@@ -74,14 +119,11 @@ class Node:
         Returns:
             The developer-friendly string representation of the current state.
 
-        Note:
-            This is used as the key of the history map.
-
         Example:
-            State [["1", "2", "3"], ["4", "5", "6"], ["7", "8", "0"]]
+            State b"123456780"
             is displayed as 123456780.
         """
-        return "".join(["".join(line) for line in self.__state])
+        return self.__state.decode()
 
     def __lt__(self, next: Self) -> bool:
         """
@@ -99,67 +141,71 @@ class Node:
     def f(self):
         return self.__f
 
+    @property
+    def key(self) -> State:
+        """
+        The current state itself, which is immutable and hashable.
+
+        Note:
+            This is used as the key of the history set.
+        """
+        return self.__state
+
     def __find_empty(self) -> Point:
         """
-        Find the coordinates of the empty tile.
+        Find the index of the empty tile,
+        by following the last move from the parent if there is one.
 
         Returns:
-            The coordinates of the empty tile.
+            The index of the empty tile.
 
         Throws:
             Exception if the empty tile is not found.
         """
-        for line_index, line in enumerate(self.__state):
-            for column_index, tile in enumerate(line):
-                if tile == EMPTY:
-                    return line_index, column_index
+        if self.__parent != None:
+            row_offset, column_offset = MOVES[self.__last_move]
+            return self.__parent.__empty + row_offset * DIMENSION + column_offset
 
-        raise Exception("Empty tile is not found")
+        index = self.__state.find(EMPTY)
+        if index == -1:
+            raise Exception("Empty tile is not found")
+        return index
 
-    def __get_next_empties(self, current_empty: Point) -> list[Point]:
+    def __get_next_empties(self, current_empty: Point) -> list[tuple[int, Point]]:
         """
-        Find the next coordinates that the empty tile can move to.
+        Find the next indices that the empty tile can move to,
+        except the one that reverses the last move back to the parent state.
 
         Args:
-            empty: The current coordinates of the empty tile.
+            current_empty: The current index of the empty tile.
 
         Returns:
-            A list of coordinates that the empty tile can move to.
-        """
-        return list(
-            filter(
-                lambda point: (
-                    0 <= point[0] <= DIMENSION - 1 and 0 <= point[1] <= DIMENSION - 1
-                ),
-                [
-                    (current_empty[0] + 1, current_empty[1]),
-                    (current_empty[0] - 1, current_empty[1]),
-                    (current_empty[0], current_empty[1] + 1),
-                    (current_empty[0], current_empty[1] - 1),
-                ],
-            )
-        )
+            A list of moves and the indices that the empty tile can move to.
+        """
+        reverse_move = self.__last_move ^ 1
+        return [
+            (move, next_empty)
+            for move, next_empty in NEXT_EMPTIES[current_empty]
+            if move != reverse_move
+        ]
 
     def __get_next_state(self, current_empty: Point, next_empty: Point) -> State:
         """
         Get the next state after the empty tile has moved.
 
         Args:
-            current_empty: The current coordinates of the empty tile.
-            next_empty: The next coordinates of the empty tile.
+            current_empty: The current index of the empty tile.
+            next_empty: The next index of the empty tile.
 
         Returns:
             The next state after the empty tile is moved.
         """
-        next_state = deepcopy(self.__state)
-        (
-            next_state[next_empty[0]][next_empty[1]],
-            next_state[current_empty[0]][current_empty[1]],
-        ) = (
-            next_state[current_empty[0]][current_empty[1]],
-            next_state[next_empty[0]][next_empty[1]],
+        next_state = bytearray(self.__state)
+        next_state[current_empty], next_state[next_empty] = (
+            next_state[next_empty],
+            next_state[current_empty],
         )
-        return next_state
+        return bytes(next_state)
 
     def __get_g(self) -> int:
         """
@@ -174,20 +220,84 @@ class Node:
     def __get_h(self) -> int:
         """
         Get the heuristic value of the current node,
-        by counting the number of incorrectly placed tiles.
-
-        Args:
-            target: The target state.
+        by summing up the Manhattan distances
+        between each tile and its target position,
+        plus the extra moves caused by linear conflicts.
 
         Returns:
             The heuristic value of the current node.
+
+        Note:
+            A child only differs from its parent by the tile that has moved,
+            so its value is updated from the parent's value
+            by the change in that tile's distance
+            and in the conflicts of the two lines it has left and entered.
+            The order of tiles along the moving direction stays the same.
         """
-        count = 0
-        for i in range(DIMENSION):
-            for j in range(DIMENSION):
-                if self.__target[i][j] not in (self.__state[i][j], EMPTY):
-                    count += 1
-        return count
+        if self.__parent != None:
+            parent = self.__parent
+            tile = self.__state[parent.__empty]
+            distances = Node.DISTANCES[tile]
+            h = parent.__h + distances[parent.__empty] - distances[self.__empty]
+
+            is_row = MOVES[self.__last_move][1] == 0
+            lines = [
+                COORDINATES[index][0 if is_row else 1]
+                for index in (self.__empty, parent.__empty)
+            ]
+            for line in lines:
+                h += self.__get_line_conflicts(line, is_row)
+                h -= parent.__get_line_conflicts(line, is_row)
+            return h
+
+        h = 0
+        for index, tile in enumerate(self.__state):
+            if tile != EMPTY:
+                h += Node.DISTANCES[tile][index]
+        for line in range(DIMENSION):
+            h += self.__get_line_conflicts(line, True)
+            h += self.__get_line_conflicts(line, False)
+        return h
+
+    def __get_line_conflicts(self, line: int, is_row: bool) -> int:
+        """
+        Get the extra moves caused by linear conflicts in a line,
+        where two tiles are both in their target line
+        but in the reversed order.
+
+        Args:
+            line: The index of the row or column.
+            is_row: True if the line is a row, or False if it is a column.
+
+        Returns:
+            The number of extra moves, 2 for each tile
+            that has to leave the line to resolve the conflicts.
+
+        Note:
+            Counting 2 for each conflicting pair would overestimate
+            when one tile conflicts with several others,
+            so the tiles that can stay are found as
+            the longest increasing sequence of their target positions.
+        """
+        targets = []
+        for offset in range(DIMENSION):
+            tile = self.__state[
+                line * DIMENSION + offset if is_row else offset * DIMENSION + line
+            ]
+            if tile == EMPTY:
+                continue
+            target_row, target_column = Node.TARGET_POS[tile]
+            if is_row and target_row == line:
+                targets.append(target_column)
+            elif not is_row and target_column == line:
+                targets.append(target_row)
+
+        stays = [1] * len(targets)
+        for i in range(len(targets)):
+            for j in range(i):
+                if targets[j] < targets[i]:
+                    stays[i] = max(stays[i], stays[j] + 1)
+        return 2 * (len(targets) - max(stays, default=0))
 
     def create_children(self) -> list[Self]:
         """
@@ -198,30 +308,34 @@ class Node:
         Returns:
             A list of children of this node.
         """
-        empty = self.__find_empty()
+        empty = self.__empty
         next_empties = self.__get_next_empties(empty)
         return [
-            Node(self.__get_next_state(empty, next), self.__target, self)
-            for next in next_empties
+            Node(self.__get_next_state(empty, next), self, move)
+            for move, next in next_empties
         ]
 
     def is_target(self) -> bool:
         """
-        Check if the current state is the target state,
-        by comparing its heuristic value to 0.
+        Check if the current state is the target state.
 
         Returns:
             True if the current state is the target state, or False otherwise.
         """
-        return self.__h == 0
+        return self.__state == Node.TARGET
 
     def print_branch(self) -> None:
         """
-        Print every node in the current branch.
+        Print every node in the current branch, from the root to this node.
         """
-        if self.__parent != None:
-            self.__parent.print_branch()
-        print(self, end="\n\n")
+        branch = []
+        node = self
+        while node != None:
+            branch.append(node)
+            node = node.__parent
+
+        for node in reversed(branch):
+            print(node, end="\n\n")
 
 
 class CandidateQueue:
@@ -234,14 +348,20 @@ class CandidateQueue:
         Also known as the open list in A* algorithm.
     """
 
-    def __init__(self, nodes: list[Node] = []) -> None:
+    def __init__(self, nodes: list[Node] | None = None) -> None:
         """
         Initialize the queue with a list of nodes.
 
         Args:
-            nodes: A list of nodes.
+            nodes: A list of nodes, default to None for an empty queue.
+
+        Note:
+            Each entry is a (f-value, insertion order, node) tuple,
+            so that ties on f-value never fall back to comparing nodes.
         """
-        self.__queue = nodes
+        self.__counter = count()
+        self.__queue = [(node.f, next(self.__counter), node) for node in nodes or []]
+        heapify(self.__queue)
 
     def push(self, node: Node | list[Node]) -> None:
         """
@@ -250,12 +370,9 @@ class CandidateQueue:
         Args:
             node: The node(s) to be pushed.
         """
-        if isinstance(node, list):
-            self.__queue.extend(node)
-        else:
-            self.__queue.append(node)
-
-        self.__queue.sort()
+        nodes = node if isinstance(node, list) else [node]
+        for node in nodes:
+            heappush(self.__queue, (node.f, next(self.__counter), node))
 
     def pop(self) -> Node:
         """
@@ -264,7 +381,7 @@ class CandidateQueue:
         Returns:
             The node with the minimal f-value.
         """
-        return self.__queue.pop(0)
+        return heappop(self.__queue)[2]
 
     def is_empty(self) -> bool:
         """
@@ -278,9 +395,8 @@ class CandidateQueue:
 
 class HistoryMap:
     """
-    Hash map of the visited A* nodes,
-    where the key is the string representation of the state of the node,
-    and the value is the node itself.
+    Hash set of the visited A* nodes,
+    where each node is recorded by the key of its state.
 
     Note:
         Also known as the closed list in A* algorithm.
@@ -288,9 +404,9 @@ class HistoryMap:
 
     def __init__(self) -> None:
         """
-        Initialize the map with an empty dictionary.
+        Initialize the map with an empty set.
         """
-        self.__map: dict[str, Node] = {}
+        self.__closed: set[State] = set()
 
     def add(self, node: Node) -> None:
         """
@@ -299,7 +415,7 @@ class HistoryMap:
         Args:
             node: The node to be added.
         """
-        self.__map[repr(node)] = node
+        self.__closed.add(node.key)
 
     def contains(self, node: Node) -> bool:
         """
@@ -311,14 +427,147 @@ class HistoryMap:
         Returns:
             True if the map contains the node, or False otherwise.
         """
-        return repr(node) in self.__map
+        return node.key in self.__closed
+
+
+def read_state() -> State:
+    """
+    Read a state from user input, one line for each row.
+
+    Returns:
+        The state read.
+
+    Throws:
+        Exception if a row has less tiles than the dimension.
+    """
+    state = bytearray()
+    for _ in range(DIMENSION):
+        line = input(">>> ").replace(" ", "").encode()
+        if len(line) < DIMENSION:
+            raise Exception(f"Expected {DIMENSION} tiles in a row, got {len(line)}")
+        state += line[:DIMENSION]
+    return bytes(state)
 
 
-def read_state():
+def set_target(target_state: State) -> None:
     """
-    Read a state from user input.
+    Share the target state with all nodes of the next search.
+
+    Args:
+        target_state: The target state.
     """
-    return [list(input(">>> ").replace(" ", ""))[:DIMENSION] for _ in range(DIMENSION)]
+    Node.TARGET = target_state
+    Node.TARGET_POS = {
+        tile: COORDINATES[index] for index, tile in enumerate(target_state)
+    }
+    Node.DISTANCES = {
+        tile: [
+            abs(row - target_row) + abs(column - target_column)
+            for row, column in COORDINATES
+        ]
+        for tile, (target_row, target_column) in Node.TARGET_POS.items()
+    }
+
+
+def count_inversions(state: State) -> int:
+    """
+    Count the pairs of tiles that are in the reversed order,
+    ignoring the empty tile.
+
+    Args:
+        state: The state to be checked.
+
+    Returns:
+        The number of inversions in the state.
+    """
+    tiles = [tile for tile in state if tile != EMPTY]
+    return sum(
+        1
+        for i in range(len(tiles))
+        for j in range(i + 1, len(tiles))
+        if tiles[i] > tiles[j]
+    )
+
+
+def is_solvable(start_state: State, target_state: State) -> bool:
+    """
+    Check if the target state can be reached from the initial state.
+
+    Args:
+        start_state: The initial state.
+        target_state: The target state.
+
+    Returns:
+        True if the target state is reachable, or False otherwise.
+
+    Note:
+        Every move keeps the parity of inversions on a board of odd dimension,
+        so the target is reachable if and only if both parities match.
+    """
+    return count_inversions(start_state) % 2 == count_inversions(target_state) % 2
+
+
+def search_branch(node: Node, threshold: int, branch: set[State]) -> Node | int:
+    """
+    Search the branch below a node with depth-first search,
+    pruning every node whose f-value exceeds the threshold.
+
+    Args:
+        node: The root node of the branch.
+        threshold: The maximal f-value to be expanded.
+        branch: The keys of the nodes from the search root to this node.
+
+    Returns:
+        The target node if it is found,
+        or the minimal f-value that exceeds the threshold otherwise.
+    """
+    if node.f > threshold:
+        return node.f
+    if node.is_target():
+        return node
+
+    next_threshold = maxsize
+    for child in node.create_children():
+        if child.key in branch:
+            continue
+
+        branch.add(child.key)
+        result = search_branch(child, threshold, branch)
+        branch.remove(child.key)
+
+        if isinstance(result, Node):
+            return result
+        next_threshold = min(next_threshold, result)
+
+    return next_threshold
+
+
+def go_ida_star(start_state: State, target_state: State) -> int:
+    """
+    Solve 8 puzzle problem with IDA*,
+    which only keeps the current branch in memory
+    instead of the open and closed lists of A*.
+
+    Args:
+        start_state: The initial state.
+        target_state: The target state.
+
+    Returns:
+        The number of steps to reach the target state, or -1 on failure.
+    """
+    if not is_solvable(start_state, target_state):
+        return -1
+
+    set_target(target_state)
+    start = Node(start_state)
+    threshold = start.f
+
+    while True:
+        result = search_branch(start, threshold, {start.key})
+        if isinstance(result, Node):
+            result.print_branch()
+            return result.f
+        threshold = result
 
 
 def go(start_state: State, target_state: State) -> int:
@@ -332,22 +581,32 @@ def go(start_state: State, target_state: State) -> int:
     Returns:
         The number of steps to reach the target state, or -1 on failure.
     """
-    candidates = CandidateQueue([Node(start_state, target_state)])
+    set_target(target_state)
+    start = Node(start_state)
+    if start.is_target():
+        start.print_branch()
+        return start.f
+
+    candidates = CandidateQueue([start])
     history = HistoryMap()
 
     while not candidates.is_empty():
         candidate = candidates.pop()
 
-        if candidate.is_target():
-            candidate.print_branch()
-            return candidate.f
-
         if history.contains(candidate):
             continue
 
-        children = candidate.create_children()
-        candidates.push(children)
         history.add(candidate)
+        children = []
+        for child in candidate.create_children():
+            # The heuristic is consistent and every move costs 1,
+            # so the first target generated is already optimal.
+            if child.is_target():
+                child.print_branch()
+                return child.f
+            if not history.contains(child):
+                children.append(child)
+        candidates.push(children)
 
     return -1
 
@@ -359,7 +618,7 @@ if __name__ == "__main__":
     target_state = DEBUG_TARGET_STATE if DEBUG else read_state()
     print()
 
-    steps = go(start_state, target_state)
+    steps = (go_ida_star if IDA_STAR else go)(start_state, target_state)
 
     if steps == -1:
         print("Fail to find a solution.")
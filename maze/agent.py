@@ -1,5 +1,11 @@
+import math
+import random
+
 import numpy as np
 
+# 每一步epsilon衰减项乘上的系数，即exp(-0.0005)
+EPSILON_DECAY = math.exp(-0.0005)
+
 
 class QLearning(object):
     def __init__(self, state_dim, action_dim, cfg):
@@ -8,7 +14,8 @@ class QLearning(object):
         self.gamma = cfg.gamma  # 衰减系数
         self.epsilon = 0
         self.sample_count = 0
-        self.Q_table = np.zeros((state_dim, action_dim))  # Q表格
+        self.epsilon_factor = 1.0  # exp(-0.0005 * sample_count)
+        self.Q_table = np.zeros((state_dim, action_dim), dtype=np.float32)  # Q表格
 
     def choose_action(self, state):
         ####################### 智能体的决策函数，需要完成Q表格方法（需要完成）#######################
@@ -20,10 +27,11 @@ class QLearning(object):
 
     def predict(self, state):
         Q_list = self.Q_table[state, :]
-        Q_max = np.max(self.Q_table[state, :])
-        action_list = np.where(Q_list == Q_max)[0]
-        action = np.random.choice(action_list)
-        return action
+        action_list = np.flatnonzero(Q_list == Q_list.max())
+        if len(action_list) == 1:
+            return int(action_list[0])
+        # 多个动作Q值相同时随机选一个
+        return int(action_list[random.randrange(len(action_list))])
 
     def update(self, state, action, reward, next_state, done):
         ############################ Q表格的更新方法（需要完成）##################################
@@ -31,21 +39,35 @@ class QLearning(object):
         if done:
             Q_target = reward
         else:
-            Q_target = reward + self.gamma * np.max(self.Q_table[next_state, :])
-        self.Q_table[state, action] += self.lr * (Q_target - Q_predict)
+            Q_target = reward + self.gamma * self.Q_table[next_state, :].max()
+        self.Q_table[state, action] = Q_predict + self.lr * (Q_target - Q_predict)
+
+    def update_batch(self, states, actions, rewards, next_states, dones):
+        # 批量更新Q表格，每个参数都是长度相同的数组
+        states = np.asarray(states)
+        actions = np.asarray(actions)
+        next_states = np.asarray(next_states)
+        rewards = np.asarray(rewards, dtype=self.Q_table.dtype)
+        not_dones = 1 - np.asarray(dones, dtype=self.Q_table.dtype)
+        Q_predict = self.Q_table[states, actions]
+        Q_target = (
+            rewards
+            + self.gamma * np.max(self.Q_table[next_states, :], axis=1) * not_dones
+        )
+        # np.add.at累加重复的(state, action)，而不是只保留最后一次
+        np.add.at(self.Q_table, (states, actions), self.lr * (Q_target - Q_predict))
 
     def is_greedy(self):
         max_epsilon = 0.9
         min_epsilon = 0.1
 
         self.sample_count += 1
-        self.epsilon = min_epsilon + (max_epsilon - min_epsilon) * np.exp(
-            -0.0005 * self.sample_count
-        )
-        return np.random.uniform() > self.epsilon
+        self.epsilon_factor *= EPSILON_DECAY
+        self.epsilon = min_epsilon + (max_epsilon - min_epsilon) * self.epsilon_factor
+        return random.random() > self.epsilon
 
     def save(self, path):
         np.save(path + "Q_table.npy", self.Q_table)
 
     def load(self, path):
-        self.Q_table = np.load(path + "Q_table.npy")
+        self.Q_table = np.load(path + "Q_table.npy").astype(np.float32, copy=False)